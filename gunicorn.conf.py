@@ -0,0 +1,17 @@
+"""
+Gunicorn configuration for the Product Service
+
+The routes spend almost all of their time waiting on the database and
+the cache, so gevent workers let each process overlap many of those
+waits instead of holding a worker for every request.
+"""
+import os
+import multiprocessing
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:" + os.getenv("PORT", "8080"))
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+# service/config.py splits the database connection budget between workers
+os.environ["GUNICORN_WORKERS"] = str(workers)
+worker_class = "gevent"
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+wsgi_app = "wsgi:app"
@@ -0,0 +1,89 @@
+######################################################################
+# Copyright 2016, 2023 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Module: cache
+
+Look-aside cache for serialized Product responses backed by Redis.
+Caching is disabled when REDIS_URI is not configured, and any Redis
+error is logged and treated as a cache miss so the database remains
+the source of truth.
+"""
+import redis
+from service import app
+
+MAX_CONNECTIONS = 32
+# Seconds a request waits for a free connection before treating it as a miss
+POOL_TIMEOUT = 0.1
+
+# One pool shared by every request so sockets to Redis are reused. It blocks
+# when all connections are busy so a burst of greenlets queues instead of
+# failing with "Too many connections".
+client = None  # pylint: disable=invalid-name
+if app.config.get("REDIS_URI"):
+    client = redis.Redis(
+        connection_pool=redis.BlockingConnectionPool.from_url(
+            app.config["REDIS_URI"], max_connections=MAX_CONNECTIONS, timeout=POOL_TIMEOUT
+        )
+    )
+
+
+def is_enabled() -> bool:
+    """Returns True when a Redis server is configured"""
+    return client is not None
+
+
+def get(key: str):
+    """Returns the cached value for key or None on a miss"""
+    if client is None:
+        return None
+    try:
+        return client.get(key)
+    except redis.RedisError as error:
+        app.logger.warning("Cache lookup failed for %s: %s", key, error)
+        return None
+
+
+def put(key: str, value, ttl: int):
+    """Stores value under key for ttl seconds"""
+    if client is None:
+        return
+    try:
+        client.setex(key, ttl, value)
+    except redis.RedisError as error:
+        app.logger.warning("Cache store failed for %s: %s", key, error)
+
+
+def delete(key: str):
+    """Removes key from the cache"""
+    if client is None:
+        return
+    try:
+        client.delete(key)
+    except redis.RedisError as error:
+        app.logger.warning("Cache delete failed for %s: %s", key, error)
+
+
+def delete_matching(pattern: str):
+    """Removes every key that matches the glob-style pattern"""
+    if client is None:
+        return
+    try:
+        keys = list(client.scan_iter(pattern))
+        if keys:
+            client.delete(*keys)
+    except redis.RedisError as error:
+        app.logger.warning("Cache invalidation failed for %s: %s", pattern, error)
@@ -13,7 +13,36 @@ DATABASE_URI = os.getenv(
 # Configure SQLAlchemy
 SQLALCHEMY_DATABASE_URI = DATABASE_URI
 SQLALCHEMY_TRACK_MODIFICATIONS = False
-# SQLALCHEMY_POOL_SIZE = 2
+
+
+def _engine_options(database_uri: str) -> dict:
+    """Returns the connection pool options for the database at database_uri
+
+    Every gunicorn worker holds its own pool, so DB_MAX_CONNECTIONS is the
+    budget for ALL workers together and must stay below the server's
+    max_connections (100 by default on PostgreSQL). gunicorn.conf.py
+    publishes its worker count as GUNICORN_WORKERS; any other server is a
+    single process. Each worker gets at least one connection, so deployments
+    with more workers than the budget must raise max_connections.
+    """
+    # Pre-ping replaces connections the database has closed underneath us
+    options = {"pool_recycle": 120, "pool_pre_ping": True}
+    if database_uri.startswith("sqlite"):
+        return options  # SQLite chooses its own pool class without a size
+
+    workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+    per_worker = max(int(os.getenv("DB_MAX_CONNECTIONS", "80")) // workers, 1)
+    max_overflow = per_worker // 3
+    options["pool_size"] = int(os.getenv("DB_POOL_SIZE", str(max(per_worker - max_overflow, 1))))
+    options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", str(max_overflow)))
+    return options
+
+
+# Keep connections pooled so requests do not pay to reconnect
+SQLALCHEMY_ENGINE_OPTIONS = _engine_options(DATABASE_URI)
+
+# Redis look-aside cache for Product responses (disabled when unset)
+REDIS_URI = os.getenv("REDIS_URI")
 
 # Secret for session management
 SECRET_KEY = os.getenv("SECRET_KEY", "sup3r-s3cr3t")
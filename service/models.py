@@ -71,8 +71,11 @@ class Product(db.Model):
     ##################################################
     # Table Schema
     ##################################################
+    # Serves list queries that filter by category and availability together
+    __table_args__ = (db.Index("ix_product_category_available", "category", "available"),)
+
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     description = db.Column(db.String(250), nullable=False)
     price = db.Column(db.Numeric, nullable=False)
     available = db.Column(db.Boolean(), nullable=False, default=True)
@@ -123,6 +126,22 @@ class Product(db.Model):
             "category": self.category.name  # convert enum to string
         }
 
+    @staticmethod
+    def serialize_row(row) -> dict:
+        """Serializes a row selected with row_columns() into a dictionary
+
+        This builds the same dictionary as serialize() straight from the
+        row so that no Product instance has to be loaded
+        """
+        return {
+            "id": row[0],
+            "name": row[1],
+            "description": row[2],
+            "price": str(row[3]),
+            "available": row[4],
+            "category": row[5].name  # convert enum to string
+        }
+
     def deserialize(self, data: dict):
         """
         Deserializes a Product from a dictionary
@@ -169,6 +188,11 @@ class Product(db.Model):
         app.app_context().push()
         db.create_all()  # make our sqlalchemy tables
 
+    @classmethod
+    def row_columns(cls) -> tuple:
+        """Returns the columns, in order, that serialize_row() expects"""
+        return (cls.id, cls.name, cls.description, cls.price, cls.available, cls.category)
+
     @classmethod
     def all(cls) -> list:
         """Returns all of the Products in the database"""
@@ -15,13 +15,46 @@
 """
 Product Service REST API
 """
-from flask import jsonify, request, url_for, make_response, abort
+import orjson
+from sqlalchemy import select, func
+from flask import request, abort, Response
 from service.common import status  # HTTP Status Codes
-from service.models import Product, Category, DataValidationError
+from service.common import cache
+from service.models import db, Product, Category, DataValidationError
 
 # Import Flask application from service
 from . import app
 
+# The health check always answers with the same body
+HEALTH_BODY = orjson.dumps({"status": 200, "message": "OK"})
+
+# Cached product lists are keyed by their query string under this prefix
+LIST_CACHE_PREFIX = "products:"
+LIST_CACHE_TTL = 60
+# Single products are cached under their id and refreshed on every write
+ITEM_CACHE_PREFIX = "product:"
+ITEM_CACHE_TTL = 300
+# Clients may reuse a Product for this many seconds before revalidating
+ITEM_MAX_AGE = 30
+
+# Product lists are returned one page at a time
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# OFFSET is bound as a signed 64-bit integer by both SQLite and PostgreSQL
+MAX_OFFSET = 2**63 - 1
+
+# Lists are encoded and sent this many rows at a time
+STREAM_BATCH_SIZE = 100
+
+# Query string values accepted as True
+TRUE_VALUES = frozenset(("true", "1", "t", "yes", "y"))
+
+# Category query values are matched case-insensitively
+CATEGORY_BY_NAME = {category.name.lower(): category for category in Category}
+
+# Lists select these columns directly instead of loading Product instances
+LIST_COLUMNS = Product.row_columns()
+
 
 ######################################################################
 # H E A L T H   C H E C K
@@ -29,7 +62,7 @@ from . import app
 @app.route("/health")
 def healthcheck():
     """Let them know our heart is beating"""
-    return jsonify(status=200, message="OK"), status.HTTP_200_OK
+    return json_response(HEALTH_BODY)
 
 
 ######################################################################
@@ -55,15 +88,20 @@ def create_products():
     check_content_type("application/json")
     
     try:
+        payload = request.get_json()
         product = Product()
-        product.deserialize(request.get_json())
+        product.deserialize(payload)
         product.create()
         
         app.logger.info("Product with ID [%s] created.", product.id)
+        invalidate_product_lists()
         
-        location_url = url_for("get_products", product_id=product.id, _external=True)
+        # Same URL as url_for("get_products", ...) without reverse routing
+        location_url = f"{request.url_root}products/{product.id}"
         
-        return jsonify(product.serialize()), status.HTTP_201_CREATED, {"Location": location_url}
+        return json_response(
+            orjson.dumps(product.serialize()), status.HTTP_201_CREATED, {"Location": location_url}
+        )
         
     except DataValidationError as error:
         abort(status.HTTP_400_BAD_REQUEST, str(error))
@@ -79,37 +117,52 @@ def create_products():
 def list_products():
     """Returns all of the Products or searches by query parameters"""
     app.logger.info("Processing List or Search request")
-    products = []
-    
+    page, page_size = get_page_args()
+    # The total needs its own COUNT query so it is only run on request
+    with_total = request.args.get("total", "").lower() in TRUE_VALUES
+
+    cache_key = LIST_CACHE_PREFIX + request.query_string.decode()
+    cached = None if with_total else cache.get(cache_key)
+    if cached is not None:
+        app.logger.info("Returning cached product list")
+        return json_response(cached)
+
     # Get query parameters
     name = request.args.get("name")
     category = request.args.get("category")
     available = request.args.get("available")
 
+    # Every filter that is given narrows the same statement
+    stmt = select(*LIST_COLUMNS)
     if name:
         app.logger.info("Finding products by name: %s", name)
-        products = Product.find_by_name(name).all()
-    elif category:
+        stmt = stmt.where(Product.name == name)
+    if category:
         app.logger.info("Finding products by category: %s", category)
-        try:
-            category_value = Category[category.upper()]
-            products = Product.find_by_category(category_value).all()
-        except KeyError:
-            # Handle case where category is invalid
+        category_value = CATEGORY_BY_NAME.get(category.lower())
+        if category_value is None:
             abort(status.HTTP_400_BAD_REQUEST, f"Invalid category: {category}")
-    elif available:
+        stmt = stmt.where(Product.category == category_value)
+    if available:
         app.logger.info("Finding products by availability: %s", available)
         # Convert string 'true'/'false' to boolean
-        is_available = available.lower() in ("true", "1", "t")
-        products = Product.find_by_availability(is_available).all()
-    else:
-        app.logger.info("Returning all products")
-        products = Product.all()
+        is_available = available.lower() in TRUE_VALUES
+        stmt = stmt.where(Product.available == is_available)
 
-    # Convert the list of Products to a list of dictionaries
-    results = [product.serialize() for product in products]
-    app.logger.info("Returning %d products", len(results))
-    return jsonify(results), status.HTTP_200_OK
+    headers = None
+    if with_total:
+        total = db.session.scalar(select(func.count()).select_from(stmt.subquery()))
+        headers = {"X-Total-Count": str(total)}
+        cache_key = None  # the cache holds only the body, not the total
+
+    # Order by id so that pages are stable between requests
+    stmt = stmt.order_by(Product.id).limit(page_size).offset((page - 1) * page_size)
+    rows = db.session.execute(stmt).all()
+    # A page is at most MAX_PAGE_SIZE rows, so fetch it all and give the
+    # connection back to the pool before a slow client reads the response
+    db.session.commit()
+    app.logger.info("Streaming %d products", len(rows))
+    return json_response(stream_products(rows, cache_key), headers=headers)
 
 
 ######################################################################
@@ -122,12 +175,19 @@ def get_products(product_id):
     This endpoint will return a Product based on its id
     """
     app.logger.info("Processing GET request for product id: %s", product_id)
-    product = Product.find(product_id)
+    cached = cache.get(f"{ITEM_CACHE_PREFIX}{product_id}")
+    if cached is not None:
+        app.logger.info("Returning cached product: %s", product_id)
+        return conditional_response(cached)
+
+    product = db.session.get(Product, product_id)
     if not product:
         abort(status.HTTP_404_NOT_FOUND, f"Product with id '{product_id}' was not found.")
     
     app.logger.info("Returning product: %s", product.name)
-    return product.serialize(), status.HTTP_200_OK
+    body = orjson.dumps(product.serialize())
+    cache.put(f"{ITEM_CACHE_PREFIX}{product_id}", body, ITEM_CACHE_TTL)
+    return conditional_response(body)
 
 
 ######################################################################
@@ -142,17 +202,21 @@ def update_products(product_id):
     app.logger.info("Processing PUT request for product id: %s", product_id)
     check_content_type("application/json")
     
-    product = Product.find(product_id)
+    product = db.session.get(Product, product_id)
     if not product:
         abort(status.HTTP_404_NOT_FOUND, f"Product with id '{product_id}' was not found.")
     
     try:
-        product.deserialize(request.get_json())
+        payload = request.get_json()
+        product.deserialize(payload)
         product.id = product_id  # make sure they cannot change the id
         product.update()
+        invalidate_product_lists()
         
         app.logger.info("Product with ID [%s] updated.", product.id)
-        return product.serialize(), status.HTTP_200_OK
+        body = orjson.dumps(product.serialize())
+        cache.put(f"{ITEM_CACHE_PREFIX}{product_id}", body, ITEM_CACHE_TTL)
+        return json_response(body)
     except DataValidationError as error:
         abort(status.HTTP_400_BAD_REQUEST, str(error))
     except Exception as error:
@@ -170,9 +234,11 @@ def delete_products(product_id):
     This endpoint will delete a Product based on its id
     """
     app.logger.info("Processing DELETE request for id: %s", product_id)
-    product = Product.find(product_id)
+    product = db.session.get(Product, product_id)
     if product:
         product.delete()
+        cache.delete(f"{ITEM_CACHE_PREFIX}{product_id}")
+        invalidate_product_lists()
         
     app.logger.info("Product with ID [%s] deleted (or not found).", product_id)
     # The spec calls for a 204 NO CONTENT even if the product doesn't exist
@@ -182,19 +248,66 @@ def delete_products(product_id):
 ######################################################################
 #  U T I L I T Y   F U N C T I O N S
 ######################################################################
+def json_response(body, code=status.HTTP_200_OK, headers=None):
+    """Wraps an already encoded JSON body, or an iterable of its chunks, in a Response"""
+    return Response(body, status=code, headers=headers, mimetype="application/json")
+
+
+def conditional_response(body: bytes):
+    """Returns a JSON body with an ETag, or 304 Not Modified if the client has it"""
+    response = json_response(body)
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.max_age = ITEM_MAX_AGE
+    return response.make_conditional(request)
+
+
+def get_page_args():
+    """Returns the requested page number and page size"""
+    try:
+        page = int(request.args.get("page", 1))
+        page_size = min(int(request.args.get("page_size", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        abort(status.HTTP_400_BAD_REQUEST, "page and page_size must be integers")
+    if page < 1 or page_size < 1:
+        abort(status.HTTP_400_BAD_REQUEST, "page and page_size must be positive")
+    if (page - 1) * page_size > MAX_OFFSET:
+        abort(status.HTTP_400_BAD_REQUEST, f"page {page} is out of range")
+    return page, page_size
+
+
+def stream_products(rows, cache_key=None):
+    """Yields the fetched rows of a list query as chunks of one JSON array
+
+    The complete body is only assembled when it will be cached under cache_key
+    """
+    parts = [] if cache_key is not None and cache.is_enabled() else None
+    separator = b""
+    yield b"["
+    for start in range(0, len(rows), STREAM_BATCH_SIZE):
+        batch = rows[start:start + STREAM_BATCH_SIZE]
+        # Encode the batch as one array and strip its own brackets
+        chunk = separator + orjson.dumps([Product.serialize_row(row) for row in batch])[1:-1]
+        separator = b","
+        if parts is not None:
+            parts.append(chunk)
+        yield chunk
+    yield b"]"
+    if parts is not None:
+        cache.put(cache_key, b"[" + b"".join(parts) + b"]", LIST_CACHE_TTL)
+
+
+def invalidate_product_lists():
+    """Drops every cached product list after the catalog changes"""
+    cache.delete_matching(LIST_CACHE_PREFIX + "*")
+
+
 def check_content_type(content_type):
     """Checks that the media type is correct"""
-    if "Content-Type" not in request.headers:
-        app.logger.error("No Content-Type specified.")
-        abort(
-            status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
-            f"Content-Type must be {content_type}",
-        )
-
-    if request.headers["Content-Type"] == content_type:
+    if request.mimetype == content_type:
         return
 
-    app.logger.error("Invalid Content-Type: %s", request.headers["Content-Type"])
+    app.logger.error("Invalid Content-Type: %s", request.content_type)
     abort(
         status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
         f"Content-Type must be {content_type}",
@@ -41,8 +41,9 @@ $(function () {
 
         let name = $("#product_name").val();
         let description = $("#product_description").val();
-        let available = $("#product_available").val() == "true";
-        let category = $("#product_category").val();
+        // "Any" only means something to a search, so it saves the old defaults
+        let available = $("#product_available").val() != "false";
+        let category = $("#product_category").val() || "UNKNOWN";
         let price = $("#product_price").val();
 
         let data = {
@@ -82,8 +83,9 @@ $(function () {
         let product_id = $("#product_id").val();
         let name = $("#product_name").val();
         let description = $("#product_description").val();
-        let available = $("#product_available").val() == "true";
-        let category = $("#product_category").val();
+        // "Any" only means something to a search, so it saves the old defaults
+        let available = $("#product_available").val() != "false";
+        let category = $("#product_category").val() || "UNKNOWN";
         let price = $("#product_price").val();
 
         let data = {
@@ -189,7 +191,8 @@ $(function () {
 
         let name = $("#product_name").val();
         let description = $("#product_description").val();
-        let available = $("#product_available").val() == "true";
+        // An empty value means "Any" and is left out of the query
+        let available = $("#product_available").val();
         let category = $("#product_category").val();
 
         let queryString = ""
@@ -0,0 +1,59 @@
+"""
+Test cases for the Redis look-aside cache
+"""
+from unittest import TestCase
+from unittest.mock import patch
+import redis
+from service.common import cache
+
+
+class TestCache(TestCase):
+    """Test the cache helpers"""
+
+    def test_disabled_without_client(self):
+        """It should treat every lookup as a miss when Redis is not configured"""
+        with patch("service.common.cache.client", None):
+            self.assertFalse(cache.is_enabled())
+            self.assertIsNone(cache.get("products:"))
+            cache.put("products:", b"[]", 60)
+            cache.delete("product:1")
+            cache.delete_matching("products:*")
+
+    @patch("service.common.cache.client")
+    def test_get_and_put(self, client_mock):
+        """It should read and write through the Redis client"""
+        client_mock.get.return_value = b"[]"
+        self.assertEqual(cache.get("products:"), b"[]")
+        client_mock.get.assert_called_once_with("products:")
+        cache.put("products:", b"[]", 60)
+        client_mock.setex.assert_called_once_with("products:", 60, b"[]")
+
+    @patch("service.common.cache.client")
+    def test_delete(self, client_mock):
+        """It should delete a single key"""
+        cache.delete("product:1")
+        client_mock.delete.assert_called_once_with("product:1")
+
+    @patch("service.common.cache.client")
+    def test_delete_matching(self, client_mock):
+        """It should delete every key matching the pattern"""
+        client_mock.scan_iter.return_value = iter([b"products:", b"products:name=a"])
+        cache.delete_matching("products:*")
+        client_mock.delete.assert_called_once_with(b"products:", b"products:name=a")
+
+        client_mock.delete.reset_mock()
+        client_mock.scan_iter.return_value = iter([])
+        cache.delete_matching("products:*")
+        client_mock.delete.assert_not_called()
+
+    @patch("service.common.cache.client")
+    def test_errors_are_misses(self, client_mock):
+        """It should fall back to a miss when Redis is unavailable"""
+        client_mock.get.side_effect = redis.ConnectionError()
+        client_mock.setex.side_effect = redis.ConnectionError()
+        client_mock.scan_iter.side_effect = redis.ConnectionError()
+        client_mock.delete.side_effect = redis.ConnectionError()
+        self.assertIsNone(cache.get("products:"))
+        cache.put("products:", b"[]", 60)
+        cache.delete("product:1")
+        cache.delete_matching("products:*")
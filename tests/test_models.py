@@ -82,6 +82,14 @@ class TestProductModel(unittest.TestCase):
         self.assertEqual(product.price, 12.50)
         self.assertEqual(product.category, Category.CLOTHS)
 
+    def test_serialize_a_row(self):
+        """It should Serialize a selected row the same as a Product"""
+        product = ProductFactory()
+        product.id = None
+        product.create()
+        row = db.session.execute(db.select(*Product.row_columns())).one()
+        self.assertEqual(Product.serialize_row(row), product.serialize())
+
     def test_add_a_product(self):
         """It should Create a product and add it to the database"""
         products = Product.all()
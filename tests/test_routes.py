@@ -16,17 +16,18 @@
 Product API Service Test Suite
 """
 import os
+import json
 import logging
 import unittest
+from unittest.mock import patch
 from decimal import Decimal
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import StaticPool
 from service import app
 from service.models import db, Product, init_db, Category
 from service.common import status
 from tests.factories import ProductFactory
 
-# Disable all but critical errors during test run
-logging.disable(logging.CRITICAL)
-
 # Define the base URL for the products
 BASE_URL = "/products"
 
@@ -40,43 +41,65 @@ class TestProductRoutes(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """This runs once before the entire test suite"""
+        # Disable all but critical errors during test run
+        logging.disable(logging.CRITICAL)
+        # Keep a configured REDIS_URI from serving data across rolled back tests
+        cls.cache_patch = patch("service.common.cache.client", None)
+        cls.cache_patch.start()
         app.config["TESTING"] = True
         app.config["DEBUG"] = False
+        # Use a private in-memory database so commits never touch the disk
+        cls.app_config = {
+            key: app.config[key]
+            for key in ("SQLALCHEMY_DATABASE_URI", "SQLALCHEMY_ENGINE_OPTIONS")
+        }
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "poolclass": StaticPool,
+            "connect_args": {"check_same_thread": False},
+        }
         init_db(app)
+        # Run the suite inside one transaction that is rolled back at the end.
+        # Session commits only release a SAVEPOINT inside of it.
+        cls.connection = db.engine.connect()
+        cls.transaction = cls.connection.begin()
+        cls.app_session = db.session
+        db.session = scoped_session(
+            sessionmaker(bind=cls.connection, join_transaction_mode="create_savepoint")
+        )
 
     @classmethod
     def tearDownClass(cls):
         """This runs once after the entire test suite"""
         db.session.close()
+        cls.transaction.rollback()
+        cls.connection.close()
+        db.session = cls.app_session
+        app.config.update(cls.app_config)
+        cls.cache_patch.stop()
+        logging.disable(logging.NOTSET)
 
     def setUp(self):
         """This runs before each test"""
-        db.session.query(Product).delete()  # clean up the last tests
-        db.session.commit()
+        self.savepoint = self.connection.begin_nested()
         self.client = app.test_client()
 
     def tearDown(self):
         """This runs after each test"""
         db.session.remove()
+        self.savepoint.rollback()  # clean up the last test
 
     ######################################################################
     #  H E L P E R   M E T H O D S
     ######################################################################
 
     def _create_products(self, count):
-        """Creates an array of Products in the database"""
-        products = []
-        for _ in range(count):
-            product = ProductFactory()
-            response = self.client.post(BASE_URL, json=product.serialize())
-            self.assertEqual(
-                response.status_code,
-                status.HTTP_201_CREATED,
-                "Could not create test Product",
-            )
-            new_product = response.get_json()
-            product.id = new_product["id"]
-            products.append(product)
+        """Creates an array of Products in the database with a single commit"""
+        products = ProductFactory.create_batch(count)
+        for product in products:
+            product.id = None  # let the database assign the primary keys
+        db.session.add_all(products)
+        db.session.commit()
         return products
 
     ######################################################################
@@ -90,6 +113,12 @@ class TestProductRoutes(unittest.TestCase):
         # Corrected assertion string to match the page content
         self.assertIn(b"Product Catalog Administration", response.get_data())
 
+    def test_health(self):
+        """It should be healthy"""
+        response = self.client.get("/health")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json(), {"status": 200, "message": "OK"})
+
     def test_create_product(self):
         """It should Create a new Product"""
         product = ProductFactory()
@@ -104,12 +133,35 @@ class TestProductRoutes(unittest.TestCase):
         
         # Check the data is correct
         new_product = response.get_json()
+        self.assertEqual(location, f"http://localhost{BASE_URL}/{new_product['id']}")
         self.assertEqual(new_product["name"], product.name, "Name does not match")
         self.assertEqual(new_product["description"], product.description, "Description does not match")
         self.assertEqual(Decimal(new_product["price"]), product.price, "Price does not match")
         self.assertEqual(new_product["available"], product.available, "Available does not match")
         self.assertEqual(new_product["category"], product.category.name, "Category does not match")
 
+    def test_create_product_from_ui_defaults(self):
+        """It should Create a Product with the values the admin UI sends for Any"""
+        product = ProductFactory()
+        data = product.serialize()
+        data.update(available=True, category="UNKNOWN")
+        response = self.client.post(BASE_URL, json=data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        new_product = response.get_json()
+        self.assertEqual(new_product["available"], True)
+        self.assertEqual(new_product["category"], "UNKNOWN")
+
+        data["category"] = ""  # what the form would post without the fallback
+        response = self.client.post(BASE_URL, json=data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_product_wrong_content_type(self):
+        """It should not Create a Product without a JSON Content-Type"""
+        response = self.client.post(BASE_URL, data="not json", content_type="text/plain")
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        response = self.client.post(BASE_URL, data="not json")
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
     def test_get_product(self):
         """It should Read a single Product"""
         test_product = self._create_products(1)[0]
@@ -123,6 +175,24 @@ class TestProductRoutes(unittest.TestCase):
         self.assertEqual(data["available"], test_product.available)
         self.assertEqual(data["category"], test_product.category.name)
 
+    def test_get_product_not_modified(self):
+        """It should return Not Modified when the Product has not changed"""
+        test_product = self._create_products(1)[0]
+        response = self.client.get(f"{BASE_URL}/{test_product.id}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response.headers["ETag"]
+        self.assertIn("max-age=30", response.headers["Cache-Control"])
+
+        response = self.client.get(f"{BASE_URL}/{test_product.id}", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.get_data(), b"")
+
+        test_product.description = "changed"
+        self.client.put(f"{BASE_URL}/{test_product.id}", json=test_product.serialize())
+        response = self.client.get(f"{BASE_URL}/{test_product.id}", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
     def test_get_product_not_found(self):
         """It should not Read a Product that is not found"""
         response = self.client.get(f"{BASE_URL}/0") # Use a known missing ID
@@ -171,6 +241,18 @@ class TestProductRoutes(unittest.TestCase):
         data = response.get_json()
         self.assertEqual(len(data), 5)
     
+    @patch("service.routes.STREAM_BATCH_SIZE", 2)
+    def test_list_streamed_in_batches(self):
+        """It should List Products that span several streamed batches"""
+        response = self.client.get(BASE_URL)
+        self.assertEqual(response.get_json(), [])
+        self._create_products(5)
+        response = self.client.get(BASE_URL, buffered=False)
+        # The page is fetched before streaming so no transaction is held open
+        self.assertFalse(db.session().in_transaction())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.get_json()), 5)
+
     def test_list_by_name(self):
         """It should List Products by Name"""
         products = self._create_products(5)
@@ -206,6 +288,11 @@ class TestProductRoutes(unittest.TestCase):
         for product in data:
             self.assertEqual(product["category"], test_category.name)
 
+    def test_list_by_invalid_category(self):
+        """It should not List Products by an unknown Category"""
+        response = self.client.get(BASE_URL, query_string="category=spaceships")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_list_by_availability(self):
         """It should List Products by Availability"""
         self._create_products(10)
@@ -220,3 +307,154 @@ class TestProductRoutes(unittest.TestCase):
         
         for product in data:
             self.assertEqual(product["available"], True)
+
+        response = self.client.get(BASE_URL, query_string="available=yes")
+        self.assertEqual(len(response.get_json()), available_count)
+
+    def test_list_by_several_filters(self):
+        """It should List Products matching every filter given"""
+        self._create_products(10)
+        matches = [
+            product for product in Product.all()
+            if product.category == Category.FOOD and product.available is True
+        ]
+        response = self.client.get(BASE_URL, query_string="category=food&available=true")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual(len(data), len(matches))
+        for product in data:
+            self.assertEqual(product["category"], "FOOD")
+            self.assertEqual(product["available"], True)
+
+        name = Product.all()[0].name
+        count = len([p for p in Product.all() if p.name == name and p.available is False])
+        response = self.client.get(BASE_URL, query_string={"name": name, "available": "false"})
+        self.assertEqual(len(response.get_json()), count)
+
+    def test_list_from_ui_search(self):
+        """It should List Products using the queries the admin UI search sends"""
+        for name, available, category in (
+            ("Hat", True, Category.CLOTHS),
+            ("Shoes", False, Category.CLOTHS),
+            ("Big Mac", True, Category.FOOD),
+        ):
+            db.session.add(ProductFactory(id=None, name=name, available=available, category=category))
+        db.session.commit()
+
+        # The search form leaves out every dropdown that is still set to "Any"
+        for query_string, names in (
+            ("", ["Hat", "Shoes", "Big Mac"]),
+            ("name=Hat", ["Hat"]),
+            ("category=CLOTHS", ["Hat", "Shoes"]),
+            ("available=false", ["Shoes"]),
+            ("name=Hat&available=true&category=CLOTHS", ["Hat"]),
+        ):
+            response = self.client.get(BASE_URL, query_string=query_string)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([product["name"] for product in response.get_json()], names, query_string)
+
+    def test_list_paginated(self):
+        """It should List Products one page at a time"""
+        products = self._create_products(5)
+        response = self.client.get(BASE_URL, query_string="page=2&page_size=2")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual(len(data), 2)
+        ids = sorted(product.id for product in products)
+        self.assertEqual([product["id"] for product in data], ids[2:4])
+        self.assertNotIn("X-Total-Count", response.headers)
+
+        response = self.client.get(BASE_URL, query_string="page=3&page_size=2&total=1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.get_json()), 1)
+        self.assertEqual(response.headers["X-Total-Count"], "5")
+
+    def test_list_bad_pagination(self):
+        """It should not List Products with an invalid page"""
+        response = self.client.get(BASE_URL, query_string="page=zero")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(BASE_URL, query_string="page=0")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(BASE_URL, query_string="page_size=-1")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(BASE_URL, query_string="page=99999999999999999999")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("service.common.cache.client")
+    def test_list_served_from_cache(self, client_mock):
+        """It should List Products from the cache without a query"""
+        client_mock.get.return_value = b'[{"id": 1}]'
+        response = self.client.get(BASE_URL, query_string="name=cached")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json(), [{"id": 1}])
+        client_mock.get.assert_called_once_with("products:name=cached")
+
+    @patch("service.common.cache.client")
+    def test_list_stored_in_cache(self, client_mock):
+        """It should cache the complete streamed Product list"""
+        client_mock.get.return_value = None
+        self._create_products(3)
+        response = self.client.get(BASE_URL, query_string="page_size=2")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.get_json()), 2)
+        key, ttl, body = client_mock.setex.call_args.args
+        self.assertEqual(key, "products:page_size=2")
+        self.assertEqual(ttl, 60)
+        self.assertEqual(json.loads(body), response.get_json())
+
+    @patch("service.common.cache.client")
+    def test_create_invalidates_lists(self, client_mock):
+        """It should drop cached Product lists when a Product is created"""
+        client_mock.scan_iter.return_value = iter([b"products:"])
+        response = self.client.post(BASE_URL, json=ProductFactory().serialize())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        client_mock.scan_iter.assert_called_once_with("products:*")
+        client_mock.delete.assert_called_once_with(b"products:")
+
+    @patch("service.common.cache.client")
+    def test_get_served_from_cache(self, client_mock):
+        """It should Read a Product from the cache without a query"""
+        client_mock.get.return_value = b'{"id": 1, "name": "cached"}'
+        response = self.client.get(f"{BASE_URL}/1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["name"], "cached")
+        client_mock.get.assert_called_once_with("product:1")
+
+    @patch("service.common.cache.client")
+    def test_get_stored_in_cache(self, client_mock):
+        """It should cache a Product read from the database"""
+        client_mock.get.return_value = None
+        test_product = self._create_products(1)[0]
+        response = self.client.get(f"{BASE_URL}/{test_product.id}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        key, ttl, body = client_mock.setex.call_args.args
+        self.assertEqual(key, f"product:{test_product.id}")
+        self.assertEqual(ttl, 300)
+        self.assertEqual(json.loads(body), response.get_json())
+
+    @patch("service.common.cache.client")
+    def test_delete_removes_from_cache(self, client_mock):
+        """It should drop the cached Product and cached lists when it is deleted"""
+        test_product = self._create_products(1)[0]
+        client_mock.scan_iter.return_value = iter([b"products:"])
+        response = self.client.delete(f"{BASE_URL}/{test_product.id}")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        client_mock.delete.assert_any_call(f"product:{test_product.id}")
+        client_mock.scan_iter.assert_called_once_with("products:*")
+        client_mock.delete.assert_any_call(b"products:")
+
+    @patch("service.common.cache.client")
+    def test_update_writes_through_cache(self, client_mock):
+        """It should refresh the cached Product and drop cached lists when it is updated"""
+        client_mock.scan_iter.return_value = iter([b"products:"])
+        test_product = self._create_products(1)[0]
+        client_mock.setex.reset_mock()
+        test_product.description = "cached description"
+        response = self.client.put(f"{BASE_URL}/{test_product.id}", json=test_product.serialize())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        key, ttl, body = client_mock.setex.call_args.args
+        self.assertEqual(key, f"product:{test_product.id}")
+        self.assertEqual(ttl, 300)
+        self.assertEqual(json.loads(body)["description"], "cached description")
+        client_mock.scan_iter.assert_called_once_with("products:*")
+        client_mock.delete.assert_called_once_with(b"products:")
@@ -0,0 +1,16 @@
+"""
+WSGI entry point for the Product Service
+
+The standard library and psycopg2 must be patched to cooperate with
+gevent BEFORE the service (and its database driver) is imported
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+# pylint: disable=wrong-import-position
+from psycogreen.gevent import patch_psycopg  # noqa: E402
+
+patch_psycopg()
+
+from service import app  # noqa: E402, F401